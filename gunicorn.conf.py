@@ -0,0 +1,13 @@
+# Gunicorn settings used by scripts/start.sh
+import multiprocessing
+import os
+
+# The AI endpoints spend seconds waiting on Gemini. gevent workers run each request on a
+# greenlet, so one worker keeps serving other requests while those calls are in flight.
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+timeout = 300
+
+# No post_fork patching needed: the gevent worker runs monkey.patch_all() itself before it loads
+# the app, and the app hooks gRPC into gevent when it builds the first Gemini client.
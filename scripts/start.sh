@@ -7,4 +7,4 @@ set -e
 python src/create_tables.py
 
 # Start the Gunicorn server
-gunicorn --timeout 300 src/app:app
+gunicorn -c gunicorn.conf.py src/app:app
@@ -1,24 +1,38 @@
 import os
-import json
+import re
+import sqlite3
+import hashlib
 import textwrap
-import google.generativeai as genai
-from datetime import datetime
-from flask import Flask, jsonify, render_template, request, redirect, url_for, flash, abort, session
+import uuid
+import zlib
+import orjson
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from flask import Flask, jsonify, render_template, request, redirect, url_for, flash, abort, Response, stream_with_context, send_file, g, session
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_caching import Cache
+from jinja2 import FileSystemBytecodeCache
 from dotenv import load_dotenv
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, select, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import deferred
+from sqlalchemy.types import TypeDecorator, LargeBinary
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, FileField
 from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, Email
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, safe_join
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileRequired
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+
+try:
+    import gevent
+    import gevent.monkey
+except ImportError: # Only needed when served by gunicorn's gevent workers
+    gevent = None
 
 load_dotenv()
 
@@ -30,29 +44,105 @@ load_dotenv()
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY environment variable not set. AI features will not work.")
-else:
-    genai.configure(api_key=GEMINI_API_KEY)
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for faster jsonify and request parsing."""
+
+    def dumps(self, obj, **kwargs):
+        # Match DefaultJSONProvider: int/None/etc. dict keys are allowed and keys are sorted when asked
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret_key')
 instance_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance')
 os.makedirs(instance_path, exist_ok=True)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(instance_path, 'database.db')
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Keep connections pooled across requests instead of reconnecting per request
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    # Sized for gevent workers, where one process has many requests in flight at once
+    'pool_size': 20,
+    'max_overflow': 40,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+    # Room for every distinct statement in the app in SQLAlchemy's compiled-SQL LRU cache
+    'query_cache_size': 1200,
+    'connect_args': {'check_same_thread': False},
+}
 db = SQLAlchemy()
 db.init_app(app)
 
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside a writer and avoids an fsync on every commit.
+    # Connections are pooled, so these run once per connection rather than per request.
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456') # 256 MB of the file read through mmap
+    cursor.execute('PRAGMA cache_size=-20000') # ~20 MB page cache per connection
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+# Compiled templates are cached on disk so each new worker skips parsing and compiling them.
+# Auto-reload stays tied to debug mode (TEMPLATES_AUTO_RELOAD unset), so it is off under gunicorn.
+jinja_cache_path = os.path.join(instance_path, 'jinja_cache')
+os.makedirs(jinja_cache_path, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_path)
+
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Reject oversized bodies before they are parsed; larger uploads are spooled to a temp file, not RAM
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 16)) * 1024 * 1024
 
+# Work factor for new password hashes; existing hashes keep the rounds they were created with
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 10))
 bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 CORS(app)
 
+# Rendered pages are cached per user/project and dropped by every write that changes them.
+# Under gunicorn use a shared backend (CACHE_TYPE=RedisCache plus CACHE_REDIS_URL) so one worker's
+# invalidation reaches the others; caching is off by default because a per-process cache can't.
+app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'NullCache')
+app.config['CACHE_NO_NULL_WARNING'] = True # Off is the intended default, don't warn on every import
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+app.config['CACHE_DEFAULT_TIMEOUT'] = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 60))
+cache = Cache(app)
+
 # --- Database Models ---
+class CompressedJSON(TypeDecorator):
+    """JSON document stored as zlib-deflated orjson bytes."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(orjson.dumps(value), 1) # Level 1: most of the size win for a fraction of the CPU
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str): # Rows written before the column was compressed hold plain JSON text
+            return orjson.loads(value)
+        return orjson.loads(zlib.decompress(value))
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -63,14 +153,16 @@ class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     script_file_name = db.Column(db.String(200), nullable=False)
-    analysis_json = db.Column(db.Text, nullable=True)
+    # Parsed analysis dict; deferred so project listings and lookups don't pull the blob
+    analysis = deferred(db.Column('analysis_json', CompressedJSON, nullable=True))
     genre = db.Column(db.String(50), nullable=True) # New column
     logline = db.Column(db.Text, nullable=True) # New column for AI-generated logline
     forecasted_budget = db.Column(db.Float, nullable=True, default=0.0) # New column for forecasted budget
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     expenses = db.relationship('Expense', backref='project', lazy=True)
 
 class Expense(db.Model):
+    __table_args__ = (db.Index('ix_expense_proj_date', 'project_id', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
@@ -79,6 +171,7 @@ class Expense(db.Model):
     category = db.Column(db.String(100), nullable=True)
 
 class Asset(db.Model):
+    __table_args__ = (db.Index('ix_asset_proj', 'project_id'),)
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -87,6 +180,7 @@ class Asset(db.Model):
     project = db.relationship('Project', backref='assets', lazy=True)
 
 class Scene(db.Model):
+    __table_args__ = (db.Index('ix_scene_proj_num', 'project_id', 'scene_number'),)
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     scene_number = db.Column(db.Integer, nullable=False)
@@ -95,6 +189,7 @@ class Scene(db.Model):
     project = db.relationship('Project', backref='scenes', lazy=True)
 
 class Schedule(db.Model):
+    __table_args__ = (db.Index('ix_schedule_proj_start', 'project_id', 'start_date'),)
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     task_description = db.Column(db.String(500), nullable=False)
@@ -105,17 +200,264 @@ class Schedule(db.Model):
     location = db.Column(db.String(100), nullable=True)
     project = db.relationship('Project', backref='schedules', lazy=True)
 
+class AnalysisCache(db.Model):
+    script_hash = db.Column(db.String(64), primary_key=True) # BLAKE2b-128 hex digest of the analyzed script text
+    result = db.Column('result_json', CompressedJSON, nullable=False)
+
+class AnalysisTask(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='Pending') # Pending, Running, Done, Failed
+    error = db.Column(db.Text, nullable=True)
+    project = db.relationship('Project', backref='analysis_tasks', lazy=True)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
+
+# --- Helpers ---
+def run_cpu_bound(func, *args):
+    """Call func(*args) without stalling other requests on the same gevent worker."""
+    # bcrypt releases the GIL but never yields to the gevent hub, so under gevent workers hand it to
+    # the hub's native thread pool. Sync workers have to wait for the result anyway, so call it directly.
+    if gevent is not None and gevent.monkey.is_module_patched('threading'):
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+def get_json_object():
+    """Return the request's JSON body if it is an object, otherwise an empty dict."""
+    # Malformed, non-JSON and non-object bodies (arrays, strings) all fall through to each handler's 400
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def get_owned_project(project_id):
+    """Return the project if it belongs to current_user, otherwise abort with 404/403."""
+    # session.get resolves from the identity map when the project is already loaded in this request
+    project = db.session.get(Project, project_id)
+    if project is None:
+        abort(404)
+    if project.user_id != current_user.id:
+        abort(403) # Forbidden
+    return project
+
+@app.before_request
+def load_view_project():
+    """Resolve the <project_id> view arg once per request and keep the owned project on g.project."""
+    # Anonymous requests fall through so login_required can redirect them to the login page
+    if not request.view_args or 'project_id' not in request.view_args or not current_user.is_authenticated:
+        return
+    g.project = get_owned_project(request.view_args['project_id'])
+
+# Project-scoped pages served through cache.cached; invalidate_project_pages drops all of them
+CACHED_PROJECT_PAGES = ('project_detail', 'expenses_page', 'schedule', 'post_production_tracking')
+
+def page_cache_key():
+    """Cache key for the current page: per project for project pages, per user otherwise."""
+    # load_view_project has already checked ownership, so a project page is the same for every request that reaches it
+    project_id = request.view_args.get('project_id')
+    if project_id is not None:
+        return f"page:project:{project_id}:{request.endpoint}"
+    return f"page:user:{current_user.id}:{request.endpoint}"
+
+def skip_page_cache():
+    # Pending flash messages are rendered into the layout, and ?summary=1 is a cheap JSON response
+    return '_flashes' in session or request.args.get('summary') == '1'
+
+def invalidate_project_pages(project_id):
+    cache.delete_many(*(f"page:project:{project_id}:{endpoint}" for endpoint in CACHED_PROJECT_PAGES))
+
+def invalidate_project_list(user_id):
+    cache.delete(f"page:user:{user_id}:list_projects")
+
+def get_owned_item(model, item_id):
+    """Return a project-scoped row (asset, scene, schedule item, expense) if its project belongs to current_user."""
+    # Fetch the row and its project's owner in one joined query instead of lazy-loading item.project
+    row = db.session.execute(
+        select(model, Project.user_id).join(Project, model.project_id == Project.id).where(model.id == item_id)
+    ).first()
+    if row is None:
+        abort(404)
+    item, owner_id = row
+    if owner_id != current_user.id:
+        abort(403) # Forbidden
+    return item
+
+
+# --- AI Prompts ---
+# Fixed instruction prefix for script analysis. The script itself is only ever sent in the
+# human message, so this system prompt is identical across calls and can be prefix-cached.
+SCRIPT_ANALYSIS_SYSTEM_PROMPT = textwrap.dedent("""
+    You are a professional script breakdown assistant for film production.
+    Analyze the following script text and return a JSON object with the following structure:
+    {{"genre": "FILM_GENRE",
+    "characters": [{{"name": "CHARACTER_NAME", "dialogue_lines": COUNT}}],
+    "locations": [{{"name": "LOCATION_NAME", "scenes": COUNT}}],
+    "props": ["PROP_NAME_1", "PROP_NAME_2"],
+    "scenes": [{{"scene_number": SCENE_NUMBER, "description": "SCENE_DESCRIPTION"}}],
+    "estimated_scenes": TOTAL_SCENE_COUNT}}
+    The "genre" should be one of the following: "Action", "Comedy", "Drama", "Horror", "Sci-Fi", "Thriller", "Romance", "Adventure", "Musical", "Indie".
+    Dialogue text may be omitted from the script; count each character cue as one line of dialogue.
+    Only return the raw JSON object, with no surrounding text, comments, or markdown.
+    Ensure the JSON is valid.
+""")
+
+@lru_cache(maxsize=None)
+def get_script_analysis_chain():
+    """Build the prompt | Gemini chain on first use; every later analysis reuses the same client."""
+    # The Gemini SDK and langchain pull in gRPC, protobuf and pydantic, so import them here rather
+    # than at module load: workers start faster and requests that never analyze a script skip them.
+    if gevent is not None and gevent.monkey.is_module_patched('socket'):
+        # gRPC blocks the gevent hub unless it is told about gevent before its first channel exists
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    import google.generativeai as genai
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+
+    genai.configure(api_key=GEMINI_API_KEY)
+    llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0.1, google_api_key=GEMINI_API_KEY)
+    # Only the script is substituted per request
+    prompt = ChatPromptTemplate.from_messages([
+        SystemMessagePromptTemplate.from_template(SCRIPT_ANALYSIS_SYSTEM_PROMPT),
+        HumanMessagePromptTemplate.from_template("Script: {script}")
+    ])
+    return prompt | llm
+
+
+# --- Script Analysis ---
+class ScriptAnalysisError(Exception):
+    """Raised when the AI response cannot be parsed into a script analysis."""
+
+    def __init__(self, message, raw_response=None):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+SCENE_HEADING_RE = re.compile(r'^(INT\.|EXT\.|INT/EXT\.|I/E\.)')
+CHARACTER_CUE_RE = re.compile(r"^[A-Z][A-Z0-9 .'\-]*(\s*\(.+\))?$")
+
+def distill_script(text):
+    """Shrink a screenplay before it is sent to the LLM.
+
+    Keeps scene headings, character cues and action lines, drops the dialogue under each cue
+    and the layout indentation. Falls back to the full text when it doesn't look like a screenplay.
+    """
+    kept_lines = []
+    compact_length = 0
+    scene_headings = 0
+    in_dialogue = False
+    dialogue_indent = None # Indentation of the first dialogue line under the current cue
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            in_dialogue = False
+            continue
+        compact_length += len(line) + 1
+        if in_dialogue:
+            indent = len(raw_line) - len(raw_line.lstrip())
+            if line.startswith('(') and line.endswith(')'):
+                continue # Parenthetical such as (beat)
+            if dialogue_indent is None:
+                dialogue_indent = indent
+                continue
+            # Indented scripts wrap a speech over several lines at the same indent. Anything else
+            # (flush-left prose after the speech, an outdented action line, a new cue) ends the dialogue.
+            if 0 < dialogue_indent <= indent and not CHARACTER_CUE_RE.match(line):
+                continue
+            in_dialogue = False
+        if SCENE_HEADING_RE.match(line):
+            scene_headings += 1
+        elif CHARACTER_CUE_RE.match(line):
+            in_dialogue = True
+            dialogue_indent = None
+        kept_lines.append(line)
+
+    distilled = '\n'.join(kept_lines)
+    if not scene_headings or len(distilled) < 0.2 * compact_length:
+        return text
+    return distilled
+
+def iter_script_analysis(project, script_text):
+    """Analyze script_text, yielding completion text as it streams in.
+
+    Saves the result and its scenes on project and returns the analysis as the generator's value.
+    """
+    script_hash = hashlib.blake2b(script_text.encode('utf-8'), digest_size=16).hexdigest()
+    cached_analysis = db.session.get(AnalysisCache, script_hash)
+
+    if cached_analysis:
+        # Same script text was analyzed before, skip the LLM round trip
+        analysis_result = cached_analysis.result
+    else:
+        # Stream the completion and assemble it as chunks arrive
+        response_chunks = []
+        for chunk in get_script_analysis_chain().stream({"script": distill_script(script_text)}):
+            response_chunks.append(chunk.content)
+            yield chunk.content
+        full_response_text = ''.join(response_chunks)
+        # Slice out the outermost JSON object, dropping any markdown fence around it, in one pass
+        json_start = full_response_text.find('{')
+        json_end = full_response_text.rfind('}')
+        cleaned_response = full_response_text[json_start:json_end + 1] if 0 <= json_start < json_end else full_response_text.strip()
+        try:
+            analysis_result = orjson.loads(cleaned_response)
+        except orjson.JSONDecodeError:
+            # The AI didn't return valid JSON, log the bad response for debugging
+            print("--- DEBUG: AI response was not valid JSON ---")
+            print(cleaned_response)
+            print("---------------------------------------------")
+            raise ScriptAnalysisError("Failed to parse the analysis from the AI response. The AI did not return valid JSON.", cleaned_response)
+
+        db.session.merge(AnalysisCache(script_hash=script_hash, result=analysis_result))
 
-# --- Token Generation and Email Sending ---
-@app.template_filter('from_json')
-@app.template_filter('from_json')
-def from_json_filter(value):
-    if value is None:
-        return None
-    return json.loads(value)
+    project.analysis = analysis_result # Save analysis to project
+    project.genre = analysis_result.get('genre') # Save the genre
+
+    # Create Scene rows with one executemany INSERT instead of one ORM object per scene
+    scene_rows = [{
+        "project_id": project.id,
+        "scene_number": scene_data['scene_number'],
+        "description": scene_data['description']
+    } for scene_data in analysis_result.get('scenes', [])]
+    if scene_rows:
+        db.session.execute(insert(Scene), scene_rows)
+
+    db.session.commit()
+    invalidate_project_pages(project.id)
+    return analysis_result
+
+def run_script_analysis(project, script_text):
+    """Analyze script_text, save the result and its scenes on project, and return the analysis."""
+    analysis = iter_script_analysis(project, script_text)
+    while True:
+        try:
+            next(analysis)
+        except StopIteration as done:
+            return done.value
+
+# Background workers for /api/script/analyze_async, so LLM calls don't hold a request worker.
+# Tasks live in this process only: if the worker restarts, in-flight tasks are lost and stay
+# Pending or Running in the database, so clients should resubmit after a long wait.
+analysis_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ANALYSIS_WORKERS', 4)))
+
+def _run_analysis_task(task_id, script_text):
+    with app.app_context():
+        # Everything is inside the try: the executor swallows exceptions, so any failure that isn't
+        # recorded here would leave the task Pending forever
+        try:
+            task = db.session.get(AnalysisTask, task_id)
+            task.status = 'Running'
+            db.session.commit()
+            run_script_analysis(task.project, script_text)
+            task.status = 'Done'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"--- DEBUG: Background analysis {task_id} failed: {e} ---")
+            task = db.session.get(AnalysisTask, task_id)
+            if task is not None:
+                task.status = 'Failed'
+                task.error = str(e)
+                db.session.commit()
 
 
 # --- Forms ---
@@ -144,8 +486,13 @@ class ProjectForm(FlaskForm):
 # --- Database Initialization ---
 @app.cli.command('init-db')
 def init_db_command():
-    """Creates the database tables."""
+    """Creates missing tables and indexes without touching existing data."""
     db.create_all()
+    # create_all skips tables that already exist, so indexes added to an existing table
+    # (e.g. ix_schedule_proj_start) have to be created one by one
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
     print('Initialized the database.')
 
 
@@ -162,17 +509,16 @@ def script_analysis():
     project_id = request.args.get('project_id', type=int)
     project = None
     if project_id:
-        project = Project.query.get_or_404(project_id)
-        if project.author != current_user:
-            abort(403) # Forbidden
+        project = get_owned_project(project_id)
     return render_template('script_analysis.html', project=project)
 
 
 
 @app.route("/projects", methods=['GET'])
 @login_required
+@cache.cached(key_prefix=page_cache_key, unless=skip_page_cache)
 def list_projects():
-    projects = Project.query.filter_by(author=current_user).all()
+    projects = db.session.scalars(select(Project).where(Project.user_id == current_user.id)).all()
     return render_template('projects.html', projects=projects)
 
 @app.route("/projects/new", methods=['GET', 'POST'])
@@ -183,49 +529,38 @@ def create_project():
         if form.script_file.data:
             filename = secure_filename(form.script_file.data.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            form.script_file.data.save(filepath)
-            
-            with open(filepath, 'r') as f:
-                script_content = f.read()
+            form.script_file.data.save(filepath, buffer_size=64 * 1024) # Copy to disk in 64KB chunks
 
             project = Project(name=form.name.data, script_file_name=filename, author=current_user)
             db.session.add(project)
             db.session.commit()
+            invalidate_project_list(current_user.id)
             flash('Your project has been created!', 'success')
             return redirect(url_for('list_projects'))
     return render_template('create_project.html', title='New Project', form=form)
 
 @app.route("/projects/<int:project_id>")
 @login_required
+@cache.cached(key_prefix=page_cache_key, unless=skip_page_cache)
 def project_detail(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
-
-    # Parse analysis_json from string to Python object if it exists
-    if project.analysis_json:
-        project.script_analysis = json.loads(project.analysis_json)
-    else:
-        project.script_analysis = None # Ensure it's None if no analysis
-
+    project = g.project
     return render_template('project_detail.html', project=project)
 
 @app.route("/projects/<int:project_id>/expenses_page")
 @login_required
+@cache.cached(key_prefix=page_cache_key, unless=skip_page_cache)
 def expenses_page(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
     return render_template('expenses.html', project=project)
 
 @app.route("/projects/<int:project_id>/assets", methods=['GET', 'POST'])
 @login_required
 def asset_tracking(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403)
+    project = g.project
     if request.method == 'POST':
-        data = request.get_json()
+        data = get_json_object()
+        if not data.get('name') or not data.get('status') or data.get('cost') is None:
+            return jsonify({"error": "Missing asset data."}), 400
         new_asset = Asset(
             project_id=project.id,
             name=data['name'],
@@ -236,47 +571,54 @@ def asset_tracking(project_id):
         db.session.commit()
         return jsonify({"message": "Asset added successfully."}), 201
     else:
-        assets = Asset.query.filter_by(project_id=project.id).all()
+        assets = db.session.scalars(select(Asset).where(Asset.project_id == project.id)).all()
         return render_template('asset.html', project=project, assets=assets)
 
 @app.route("/api/asset/<int:asset_id>", methods=['DELETE'])
 @login_required
 def delete_asset(asset_id):
-    asset = Asset.query.get_or_404(asset_id)
-    if asset.project.author != current_user:
-        abort(403)
+    asset = get_owned_item(Asset, asset_id)
     db.session.delete(asset)
     db.session.commit()
     return jsonify({"message": "Asset deleted successfully."}), 200
 
 @app.route("/projects/<int:project_id>/post_production", methods=['GET'])
 @login_required
+@cache.cached(key_prefix=page_cache_key, unless=skip_page_cache)
 def post_production_tracking(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403)
-    scenes = Scene.query.filter_by(project_id=project.id).order_by(Scene.scene_number).all()
-    
+    project = g.project
+
+    # ?summary=1 only needs the progress bar numbers, so let SQLite count them without loading any scenes
+    if request.args.get('summary') == '1':
+        total_scenes, done_scenes = db.session.execute(
+            select(func.count(Scene.id), func.count(Scene.id).filter(Scene.status == 'Done'))
+            .where(Scene.project_id == project.id)
+        ).one()
+        progress = (done_scenes / total_scenes) * 100 if total_scenes > 0 else 0
+        return jsonify({"total_scenes": total_scenes, "done_scenes": done_scenes, "progress": progress}), 200
+
+    # The page renders every scene anyway, so count from the rows already loaded
+    scenes = db.session.scalars(select(Scene).where(Scene.project_id == project.id).order_by(Scene.scene_number)).all()
     total_scenes = len(scenes)
-    done_scenes = len([s for s in scenes if s.status == 'Done'])
+    done_scenes = sum(1 for scene in scenes if scene.status == 'Done')
     progress = (done_scenes / total_scenes) * 100 if total_scenes > 0 else 0
-
     return render_template('post_production.html', project=project, scenes=scenes, progress=progress)
 
 @app.route("/api/scene/<int:scene_id>", methods=['PUT', 'DELETE'])
 @login_required
 def handle_scene(scene_id):
-    scene = Scene.query.get_or_404(scene_id)
-    if scene.project.author != current_user:
-        abort(403)
+    scene = get_owned_item(Scene, scene_id)
+    project_id = scene.project_id # Read before commit expires the row
     if request.method == 'PUT':
-        data = request.get_json()
+        data = get_json_object()
         scene.status = data.get('status', scene.status)
         db.session.commit()
+        invalidate_project_pages(project_id)
         return jsonify({"message": "Scene updated successfully."}), 200
     elif request.method == 'DELETE':
         db.session.delete(scene)
         db.session.commit()
+        invalidate_project_pages(project_id)
         return jsonify({"message": "Scene deleted successfully."}), 200
 
 # --- Authentication Routes ---
@@ -286,7 +628,7 @@ def register():
         return redirect(url_for('index'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = run_cpu_bound(bcrypt.generate_password_hash, form.password.data).decode('utf-8')
         user = User(email=form.email.data, password=hashed_password)
         db.session.add(user)
         db.session.commit()
@@ -302,8 +644,8 @@ def login():
         return redirect(url_for('index'))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        user = db.session.scalars(select(User).where(User.email == form.email.data)).first()
+        if user and run_cpu_bound(bcrypt.check_password_hash, user.password, form.password.data):
             login_user(user, remember=True)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('index'))
@@ -329,114 +671,163 @@ def analyze_script():
     if not GEMINI_API_KEY:
         return jsonify({"error": "GEMINI_API_KEY not configured on the server."}), 500
 
-    project_id = request.get_json().get('project_id')
-    script_text = request.get_json().get('script')
+    data = get_json_object()
+    project_id = data.get('project_id')
+    script_text = data.get('script')
 
     if not project_id:
         return jsonify({"error": "Project ID is required for script analysis."}), 400
 
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = get_owned_project(project_id)
 
     if not script_text or not isinstance(script_text, str) or len(script_text.strip()) < 50:
         return jsonify({"error": "Invalid or insufficient script text provided."}), 400
 
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0.1, google_api_key=GEMINI_API_KEY)
-
-        system_template = textwrap.dedent("""
-            You are a professional script breakdown assistant for film production.
-            Analyze the following script text and return a JSON object with the following structure:
-            {{"genre": "FILM_GENRE",
-            "characters": [{{"name": "CHARACTER_NAME", "dialogue_lines": COUNT}}],
-            "locations": [{{"name": "LOCATION_NAME", "scenes": COUNT}}],
-            "props": ["PROP_NAME_1", "PROP_NAME_2"],
-            "scenes": [{{"scene_number": SCENE_NUMBER, "description": "SCENE_DESCRIPTION"}}],
-            "estimated_scenes": TOTAL_SCENE_COUNT}}
-            The "genre" should be one of the following: "Action", "Comedy", "Drama", "Horror", "Sci-Fi", "Thriller", "Romance", "Adventure", "Musical", "Indie".
-            Only return the raw JSON object, with no surrounding text, comments, or markdown.
-            Ensure the JSON is valid.
-        """)
-        human_template = "Script: {script}"
-
-        prompt_template = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(system_template),
-            HumanMessagePromptTemplate.from_template(human_template)
-        ])
-
-        chain = prompt_template | llm
-
-        response = chain.invoke({"script": script_text})
-
-        full_response_text = response.content
-        cleaned_response = full_response_text.strip().replace('```json', '').replace('```', '').strip()
-        try:
-            analysis_result = json.loads(cleaned_response)
-            project.analysis_json = json.dumps(analysis_result) # Save analysis to project
-            project.genre = analysis_result.get('genre') # Save the genre
-
-            # Create Scene objects
-            if 'scenes' in analysis_result:
-                for scene_data in analysis_result['scenes']:
-                    scene = Scene(
-                        project_id=project.id,
-                        scene_number=scene_data['scene_number'],
-                        description=scene_data['description']
-                    )
-                    db.session.add(scene)
-
-            db.session.commit()
-            return jsonify(analysis_result)
-        except json.JSONDecodeError:
-            # The AI didn't return valid JSON, log the bad response for debugging
-            print("--- DEBUG: AI response was not valid JSON ---")
-            print(cleaned_response)
-            print("---------------------------------------------")
-            return jsonify({"error": "Failed to parse the analysis from the AI response. The AI did not return valid JSON.", "raw_response_for_debugging": cleaned_response}), 500
-
+        analysis_result = run_script_analysis(project, script_text)
+        return jsonify(analysis_result)
+    except ScriptAnalysisError as e:
+        return jsonify({"error": str(e), "raw_response_for_debugging": e.raw_response}), 500
     except Exception as e:
         # Catch other potential errors from the API call itself
         print(f"--- DEBUG: An unexpected error occurred: {e} ---")
         return jsonify({"error": f"An unexpected error occurred during the AI API call: {str(e)}"}), 500
 
+@app.route('/api/script/analyze/stream', methods=['POST'])
+@login_required
+def analyze_script_stream():
+    """
+    Stream AI script analysis as NDJSON: {"chunk": ...} lines while Gemini generates,
+    then a final {"done": true, "result": ...} or {"error": ...} line.
+    """
+    if not GEMINI_API_KEY:
+        return jsonify({"error": "GEMINI_API_KEY not configured on the server."}), 500
+
+    data = get_json_object()
+    project_id = data.get('project_id')
+    script_text = data.get('script')
+
+    if not project_id:
+        return jsonify({"error": "Project ID is required for script analysis."}), 400
+
+    project = get_owned_project(project_id)
+
+    if not script_text or not isinstance(script_text, str) or len(script_text.strip()) < 50:
+        return jsonify({"error": "Invalid or insufficient script text provided."}), 400
+
+    def generate():
+        analysis = iter_script_analysis(project, script_text)
+        try:
+            while True:
+                yield orjson.dumps({"chunk": next(analysis)}) + b'\n'
+        except StopIteration as done:
+            yield orjson.dumps({"done": True, "result": done.value}) + b'\n'
+        except ScriptAnalysisError as e:
+            yield orjson.dumps({"error": str(e), "raw_response_for_debugging": e.raw_response}) + b'\n'
+        except Exception as e:
+            print(f"--- DEBUG: An unexpected error occurred: {e} ---")
+            yield orjson.dumps({"error": f"An unexpected error occurred during the AI API call: {str(e)}"}) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/script/analyze_async', methods=['POST'])
+@login_required
+def analyze_script_async():
+    """
+    Queue AI script analysis in the background and return a task ID to poll.
+    """
+    if not GEMINI_API_KEY:
+        return jsonify({"error": "GEMINI_API_KEY not configured on the server."}), 500
+
+    data = get_json_object()
+    project_id = data.get('project_id')
+    script_text = data.get('script')
+
+    if not project_id:
+        return jsonify({"error": "Project ID is required for script analysis."}), 400
+
+    project = get_owned_project(project_id)
+
+    if not script_text or not isinstance(script_text, str) or len(script_text.strip()) < 50:
+        return jsonify({"error": "Invalid or insufficient script text provided."}), 400
+
+    task = AnalysisTask(id=uuid.uuid4().hex, project_id=project.id)
+    db.session.add(task)
+    db.session.commit()
+    analysis_executor.submit(_run_analysis_task, task.id, script_text)
+    return jsonify({"task_id": task.id, "status": task.status}), 202
+
+@app.route('/api/task/<task_id>', methods=['GET'])
+@login_required
+def get_analysis_task(task_id):
+    task = db.get_or_404(AnalysisTask, task_id)
+    if task.project.user_id != current_user.id:
+        abort(403) # Forbidden
+
+    response = {"task_id": task.id, "status": task.status}
+    if task.status == 'Done':
+        response["result"] = task.project.analysis
+    elif task.status == 'Failed':
+        response["error"] = task.error
+    return jsonify(response)
+
 @app.route('/api/project/<int:project_id>/script_content', methods=['GET'])
 @login_required
 def get_script_content(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
 
     if not project.script_file_name:
         return jsonify({"error": "No script file associated with this project."}), 404
 
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], project.script_file_name)
-    if not os.path.exists(filepath):
+    filepath = safe_join(app.config['UPLOAD_FOLDER'], project.script_file_name)
+    if filepath is None or not os.path.exists(filepath):
         return jsonify({"error": "Script file not found on server."}), 404
 
-    try:
-        with open(filepath, 'r') as f:
-            script_content = f.read()
-        return jsonify({"script_content": script_content})
-    except Exception as e:
-        return jsonify({"error": f"Error reading script file: {str(e)}"}), 500
+    # Clients that ask for the raw text get the file itself; send_file goes through
+    # wsgi.file_wrapper (sendfile under gunicorn) and handles ETag/Last-Modified/304
+    wants_raw = request.args.get('raw') == '1' or \
+        request.accept_mimetypes.best_match(['application/json', 'text/plain']) == 'text/plain'
+    if wants_raw:
+        response = send_file(filepath, mimetype='text/plain', conditional=True, etag=True)
+        response.vary.add('Accept') # Same URL serves JSON or text depending on Accept
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    # Revalidate with an ETag built from the file's mtime and size, so an unchanged script
+    # costs a stat and a 304 instead of a read and a JSON encode
+    file_stat = os.stat(filepath)
+    etag = f"{file_stat.st_mtime_ns}-{file_stat.st_size}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        try:
+            with open(filepath, 'r') as f:
+                script_content = f.read()
+            response = jsonify({"script_content": script_content})
+        except Exception as e:
+            return jsonify({"error": f"Error reading script file: {str(e)}"}), 500
+    response.set_etag(etag)
+    response.vary.add('Accept')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route('/schedule/<int:project_id>')
 @login_required
+@cache.cached(key_prefix=page_cache_key, unless=skip_page_cache)
 def schedule(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
 
-    script_analysis_results = session.get('script_analysis_results', {})
+    # The analysis is already stored on the project; read it from there instead of the session cookie
+    script_analysis_results = project.analysis or {}
     characters = script_analysis_results.get('characters', [])
     locations = script_analysis_results.get('locations', [])
     props = script_analysis_results.get('props', [])
-    schedule_items = Schedule.query.filter_by(project_id=project.id).all()
 
     schedule_by_location = {}
-    for item in schedule_items:
+    for item in project.schedules:
         location = item.location if item.location else "No Location"
         if location not in schedule_by_location:
             schedule_by_location[location] = []
@@ -447,23 +838,29 @@ def schedule(project_id):
 @app.route('/api/schedule/<int:project_id>', methods=['GET', 'POST'])
 @login_required
 def handle_schedule_items(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
 
     if request.method == 'POST':
-        data = request.get_json()
+        data = get_json_object()
+        if not all([data.get('task_description'), data.get('start_date'), data.get('end_date')]):
+            return jsonify({"error": "Missing schedule item data."}), 400
+        try:
+            start_date = date.fromisoformat(data['start_date'])
+            end_date = date.fromisoformat(data['end_date'])
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid date format."}), 400
         new_schedule_item = Schedule(
             project_id=project.id,
             task_description=data['task_description'],
-            start_date=datetime.strptime(data['start_date'], '%Y-%m-%d').date(),
-            end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date(),
+            start_date=start_date,
+            end_date=end_date,
             assigned_to=data.get('assigned_to'),
             status=data.get('status', 'Pending'),
             location=data.get('location')
         )
         db.session.add(new_schedule_item)
         db.session.commit()
+        invalidate_project_pages(project_id)
         return jsonify({
             "id": new_schedule_item.id,
             "task_description": new_schedule_item.task_description,
@@ -474,107 +871,134 @@ def handle_schedule_items(project_id):
             "location": new_schedule_item.location
         }), 201
     else: # GET request
-        schedule_items = Schedule.query.filter_by(project_id=project.id).order_by(Schedule.start_date).all()
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        # Read-only listing: fetch plain column tuples instead of hydrating ORM objects
+        schedule_rows = db.session.execute(select(
+            Schedule.id, Schedule.task_description, Schedule.start_date, Schedule.end_date,
+            Schedule.assigned_to, Schedule.status, Schedule.location
+        ).where(Schedule.project_id == project.id).order_by(Schedule.start_date).limit(limit).offset(offset)).all()
         return jsonify([{
-            "id": item.id,
-            "task_description": item.task_description,
-            "start_date": item.start_date.isoformat(),
-            "end_date": item.end_date.isoformat(),
-            "assigned_to": item.assigned_to,
-            "status": item.status,
-            "location": item.location
-        } for item in schedule_items])
+            "id": row.id,
+            "task_description": row.task_description,
+            "start_date": row.start_date.isoformat(),
+            "end_date": row.end_date.isoformat(),
+            "assigned_to": row.assigned_to,
+            "status": row.status,
+            "location": row.location
+        } for row in schedule_rows])
+
+@app.route('/api/schedule/<int:project_id>/bulk', methods=['POST'])
+@login_required
+def bulk_create_schedule_items(project_id):
+    project = g.project
+
+    data = get_json_object()
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "A non-empty list of schedule items is required."}), 400
+
+    try:
+        new_schedule_items = [Schedule(
+            project_id=project.id,
+            task_description=item['task_description'],
+            start_date=date.fromisoformat(item['start_date']),
+            end_date=date.fromisoformat(item['end_date']),
+            assigned_to=item.get('assigned_to'),
+            status=item.get('status', 'Pending'),
+            location=item.get('location')
+        ) for item in items]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid schedule item data."}), 400
+
+    # One transaction for the whole batch instead of a commit per item
+    db.session.add_all(new_schedule_items)
+    db.session.flush()
+    # Serialize before commit so the response doesn't refresh each expired row
+    created = [{
+        "id": item.id,
+        "task_description": item.task_description,
+        "start_date": item.start_date.isoformat(),
+        "end_date": item.end_date.isoformat(),
+        "assigned_to": item.assigned_to,
+        "status": item.status,
+        "location": item.location
+    } for item in new_schedule_items]
+    db.session.commit()
+    invalidate_project_pages(project_id)
+    return jsonify(created), 201
 
 @app.route('/api/schedule/item/<int:item_id>', methods=['PUT', 'DELETE'])
 @login_required
 def handle_single_schedule_item(item_id):
-    schedule_item = Schedule.query.get_or_404(item_id)
-    if schedule_item.project.author != current_user:
-        abort(403) # Forbidden
+    schedule_item = get_owned_item(Schedule, item_id)
+    project_id = schedule_item.project_id # Read before commit expires the row
 
     if request.method == 'PUT':
-        data = request.get_json()
+        data = get_json_object()
         schedule_item.task_description = data.get('task_description', schedule_item.task_description)
-        schedule_item.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else schedule_item.start_date
-        schedule_item.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else schedule_item.end_date
+        schedule_item.start_date = date.fromisoformat(data['start_date']) if data.get('start_date') else schedule_item.start_date
+        schedule_item.end_date = date.fromisoformat(data['end_date']) if data.get('end_date') else schedule_item.end_date
         schedule_item.assigned_to = data.get('assigned_to', schedule_item.assigned_to)
         schedule_item.status = data.get('status', schedule_item.status)
         schedule_item.location = data.get('location', schedule_item.location)
         db.session.commit()
+        invalidate_project_pages(project_id)
         return jsonify({"message": "Schedule item updated."}), 200
     elif request.method == 'DELETE':
         db.session.delete(schedule_item)
         db.session.commit()
+        invalidate_project_pages(project_id)
         return jsonify({"message": "Schedule item deleted."}), 200
 
 @app.route('/api/schedule/<int:project_id>/generate_tasks_from_script', methods=['POST'])
 @login_required
 def generate_tasks_from_script(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
 
-    if not project.analysis_json:
+    analysis_data = project.analysis
+    if not analysis_data:
         return jsonify({"error": "No script analysis found for this project."}), 400
 
-    analysis_data = json.loads(project.analysis_json)
-    generated_tasks = []
     today = datetime.now().date()
+    generated_tasks = []
+
+    def add_task(task_description, assigned_to, location=None):
+        # Every row has the same keys so the whole batch goes out as one executemany INSERT
+        generated_tasks.append({
+            "project_id": project.id,
+            "task_description": task_description,
+            "start_date": today,
+            "end_date": today, # Can be adjusted later
+            "assigned_to": assigned_to,
+            "status": 'Pending',
+            "location": location
+        })
 
     # Generate tasks for characters
     for char in analysis_data.get('characters', []):
-        task_description = f"Character: {char['name']} - Costume fitting, makeup test, and rehearsal."
-        new_task = Schedule(
-            project_id=project.id,
-            task_description=task_description,
-            start_date=today,
-            end_date=today, # Can be adjusted later
-            assigned_to=char['name'],
-            status='Pending'
-        )
-        db.session.add(new_task)
-        generated_tasks.append(new_task)
+        add_task(f"Character: {char['name']} - Costume fitting, makeup test, and rehearsal.", char['name'])
 
     # Generate tasks for locations
     for loc in analysis_data.get('locations', []):
-        task_description = f"Location: {loc['name']} - Scouting, permits, and set dressing."
-        new_task = Schedule(
-            project_id=project.id,
-            task_description=task_description,
-            start_date=today,
-            end_date=today, # Can be adjusted later
-            assigned_to='Location Manager',
-            status='Pending',
-            location=loc['name']
-        )
-        db.session.add(new_task)
-        generated_tasks.append(new_task)
+        add_task(f"Location: {loc['name']} - Scouting, permits, and set dressing.", 'Location Manager', loc['name'])
 
     # Generate tasks for props
     for prop in analysis_data.get('props', []):
-        task_description = f"Prop: {prop} - Sourcing, acquisition, or fabrication."
-        new_task = Schedule(
-            project_id=project.id,
-            task_description=task_description,
-            start_date=today,
-            end_date=today, # Can be adjusted later
-            assigned_to='Prop Master',
-            status='Pending'
-        )
-        db.session.add(new_task)
-        generated_tasks.append(new_task)
+        add_task(f"Prop: {prop} - Sourcing, acquisition, or fabrication.", 'Prop Master')
 
+    if generated_tasks:
+        db.session.execute(insert(Schedule), generated_tasks)
     db.session.commit()
-    return jsonify({"message": f"{len(generated_tasks)} tasks generated successfully from script analysis.", "tasks": [task.task_description for task in generated_tasks]}), 201
+    invalidate_project_pages(project_id)
+    return jsonify({"message": f"{len(generated_tasks)} tasks generated successfully from script analysis.", "tasks": [task["task_description"] for task in generated_tasks]}), 201
 
 @app.route('/api/project/<int:project_id>/update_budget', methods=['POST'])
 @login_required
 def update_project_budget(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
 
-    data = request.get_json()
+    data = get_json_object()
     print(f"DEBUG: request.get_json() returned: {data}")
     print(f"DEBUG: request.data (raw body) is: {request.data}")
     new_budget = data.get('forecasted_budget')
@@ -584,17 +1008,16 @@ def update_project_budget(project_id):
 
     project.forecasted_budget = new_budget
     db.session.commit()
+    invalidate_project_pages(project_id)
     return jsonify({"message": "Project budget updated successfully."}), 200
 
 @app.route('/api/project/<int:project_id>/expenses', methods=['GET', 'POST'])
 @login_required
 def handle_project_expenses(project_id):
-    project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
-        abort(403) # Forbidden
+    project = g.project
 
     if request.method == 'POST':
-        data = request.get_json()
+        data = get_json_object()
         description = data.get('description')
         amount = data.get('amount')
         date_str = data.get('date')
@@ -604,7 +1027,7 @@ def handle_project_expenses(project_id):
             return jsonify({"error": "Missing expense data."}), 400
         try:
             amount = float(amount)
-            expense_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            expense_date = date.fromisoformat(date_str)
         except ValueError:
             return jsonify({"error": "Invalid amount or date format."}), 400
 
@@ -625,7 +1048,7 @@ def handle_project_expenses(project_id):
             "category": new_expense.category
         }}), 201
     else: # GET request
-        expenses = Expense.query.filter_by(project_id=project.id).order_by(Expense.date.desc()).all()
+        expenses = db.session.scalars(select(Expense).where(Expense.project_id == project.id).order_by(Expense.date.desc())).all()
         return jsonify([{
             "id": expense.id,
             "description": expense.description,
@@ -637,18 +1060,16 @@ def handle_project_expenses(project_id):
 @app.route('/api/expense/<int:expense_id>', methods=['PUT', 'DELETE'])
 @login_required
 def handle_single_expense(expense_id):
-    expense = Expense.query.get_or_404(expense_id)
-    if expense.project.author != current_user:
-        abort(403) # Forbidden
+    expense = get_owned_item(Expense, expense_id)
 
     if request.method == 'PUT':
-        data = request.get_json()
+        data = get_json_object()
         expense.description = data.get('description', expense.description)
         expense.amount = data.get('amount', expense.amount)
         date_str = data.get('date')
         if date_str:
             try:
-                expense.date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                expense.date = date.fromisoformat(date_str)
             except ValueError:
                 return jsonify({"error": "Invalid date format."}), 400
         expense.category = data.get('category', expense.category)